@@ -2,24 +2,74 @@
 import asyncio
 import json
 import logging
+import math
+import operator
+import queue
 import re
+import socket
 import sqlite3
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 from aiohttp import web
 
+try:
+    import orjson
+
+    def _loads(data: bytes):
+        return orjson.loads(data)
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # fall back to the stdlib parser
+    def _reject_constant(name):
+        raise ValueError(f"Unsupported JSON constant: {name}")
+
+    # Reject NaN/Infinity like orjson does; browsers can't parse them
+    def _loads(data: bytes):
+        return json.loads(data, parse_constant=_reject_constant)
+
+    def _finite(obj):
+        # orjson writes non-finite floats (e.g. Infinity in rows stored
+        # before validation existed) as null; do the same
+        if isinstance(obj, float):
+            return obj if math.isfinite(obj) else None
+        if isinstance(obj, (list, tuple)):
+            return [_finite(item) for item in obj]
+        if isinstance(obj, dict):
+            return {key: _finite(value) for key, value in obj.items()}
+        return obj
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(_finite(obj), allow_nan=False).encode()
+
 HOST = "127.0.0.1"
 PORT = 39000
 DB_PATH = Path("weather.db")
 
+MAX_MESSAGE_SIZE = 2048
+STREAM_LIMIT = 4096  # StreamReader buffer cap per connection
+
 logging.basicConfig(
     level=logging.INFO,
     format="[%(asctime)s] %(levelname)s: %(message)s",
 )
+# The format above never uses thread, process or caller info, so
+# skip collecting it for every record
+logging.logThreads = False
+logging.logProcesses = False
+logging._srcfile = None
+
+log = logging.getLogger(__name__)
 
-SAFE_NAME = re.compile(r"^[a-zA-Z0-9_\-]+$")
+SAFE_NAME = re.compile(r"[a-zA-Z0-9_\-]+")
+_match = SAFE_NAME.fullmatch
 
+# Station ids repeat on every message, so remember the ones already checked
+@lru_cache(maxsize=1024)
 def sanitize(name: str) -> str:
-    if not SAFE_NAME.match(name):
+    if not _match(name):
         raise ValueError(f"Unsafe station_id: {name!r}")
     return name
 
@@ -27,6 +77,7 @@ def sanitize(name: str) -> str:
 # --------------------------------------------------------
 # 🔥 NEW: Extract station location from station_id
 # --------------------------------------------------------
+@lru_cache(maxsize=256)
 def extract_station_location(station_id: str) -> str:
     """
     Examples:
@@ -35,48 +86,60 @@ def extract_station_location(station_id: str) -> str:
       station03_desert    -> desert
       station04           -> station04 (fallback)
     """
-    parts = station_id.split("_")
-    if len(parts) > 1:
-        return parts[-1]  # location part
+    _, sep, location = station_id.rpartition("_")
+    if sep:
+        return location   # location part
     return station_id     # fallback if no location provided
 
 
-def get_latest_data(limit=40):
-    conn = sqlite3.connect("weather.db")
-    cur = conn.cursor()
+DASHBOARD_ROWS = 40
 
-    cur.execute("""
-        SELECT station_id, timestamp, temperature, humidity, wind
-        FROM weather_data
-        ORDER BY id DESC
-        LIMIT ?
-    """, (limit,))
+# Shared statement strings so sqlite3's per-connection statement
+# cache hits on every call instead of re-preparing
+_SELECT_SQL = """
+    SELECT id, station_id, timestamp, temperature, humidity, wind
+    FROM weather_data
+    ORDER BY id DESC
+    LIMIT ?
+"""
+_INSERT_SQL = """
+    INSERT INTO weather_data (station_id, timestamp, temperature, humidity, wind)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+def get_latest_data(limit=DASHBOARD_ROWS):
+    cur = _reader_conn.cursor()
+
+    cur.execute(_SELECT_SQL, (limit,))
 
     rows = cur.fetchall()
-    conn.close()
 
     return rows
 
 
-async def handle_web(request):
-    rows = get_latest_data()
+def to_dashboard_rows(rows: list) -> list:
+    # 🔥 REPLACED: station_id -> location
+    return [
+        (row_id, extract_station_location(station_id), ts, t, h, w)
+        for row_id, station_id, ts, t, h, w in rows
+    ]
+
 
-    html = """
+INDEX_HTML = """
     <html>
     <head>
         <title>Weather Station Monitor</title>
-        <meta http-equiv="refresh" content="2">
         <style>
             body { font-family: Arial; padding: 20px; }
-            table { border-collapse: collapse; width: 100%; }
+            table { border-collapse: collapse; width: 100%%; }
             th, td { border: 1px solid #ccc; padding: 8px; }
             th { background: #eee; }
         </style>
     </head>
     <body>
         <h2>Weather Station Live Data</h2>
-        <p>(Auto-refreshes every 2 seconds)</p>
-        <table>
+        <p>(Live updates)</p>
+        <table id="data">
             <tr>
                 <th>Location</th>
                 <th>Timestamp</th>
@@ -84,23 +147,184 @@ async def handle_web(request):
                 <th>Humidity</th>
                 <th>Wind</th>
             </tr>
-    """
+        </table>
+    <script>
+        const table = document.getElementById("data");
+
+        let lastId = 0;
+
+        // rows arrive oldest first; each one goes to the top of the table.
+        // Rows already shown (by id) are skipped, so the initial fetch
+        // and the stream can overlap.
+        function addRows(rows) {
+            for (const [id, location, ts, t, h, w] of rows) {
+                if (id <= lastId) {
+                    continue;
+                }
+                lastId = id;
+                const row = table.insertRow(1);
+                // Old rows may hold text in the REAL columns; show it as-is
+                const stamp = typeof ts === "number" ? ts.toFixed(2) : ts;
+                for (const value of [location, stamp, t, h, w]) {
+                    row.insertCell().textContent = value;
+                }
+            }
+            while (table.rows.length > %d) {
+                table.deleteRow(-1);
+            }
+        }
+
+        function clearRows() {
+            while (table.rows.length > 1) {
+                table.deleteRow(-1);
+            }
+        }
+
+        // Pushed rows held while a snapshot loads, or null
+        let pending = null;
+        let loads = 0;
+
+        function flushPending() {
+            for (const rows of pending) {
+                addRows(rows);
+            }
+            pending = null;
+        }
+
+        function loadSnapshot() {
+            const load = ++loads;
+            pending = [];
+            // After a server restart with a new database ids start at 1 again
+            lastId = 0;
+
+            fetch("/data.json")
+                .then((response) => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then((data) => {
+                    if (load !== loads) {
+                        return;  // superseded by a reconnect
+                    }
+                    clearRows();
+                    addRows(data.rows.reverse());
+                    flushPending();
+                })
+                .catch((error) => {
+                    if (load !== loads) {
+                        return;
+                    }
+                    console.error("Could not load /data.json:", error);
+                    flushPending();  // keep showing live rows
+                });
+        }
+
+        // The server registers the subscriber before the stream opens, so
+        // anything committed after the snapshot is read arrives as an event.
+        // onopen also fires on every reconnect, which reloads the snapshot.
+        const source = new EventSource("/stream");
+        source.onopen = loadSnapshot;
+        source.onmessage = (event) => {
+            const rows = JSON.parse(event.data);
+            if (pending) {
+                pending.push(rows);
+            } else {
+                addRows(rows);
+            }
+        };
+    </script>
+    </body></html>
+    """ % (DASHBOARD_ROWS + 1)
+
+INDEX_BODY = INDEX_HTML.encode("utf-8")
+
+async def handle_index(request):
+    return web.Response(body=INDEX_BODY, content_type="text/html", charset="utf-8")
+
+# Latest rows as JSON for the initial page load. Invalidated by the
+# writer on every commit so it never lags behind the stream.
+CACHE_TTL = 1.0
+_cache = {"exp": 0.0, "body": b""}
+
+async def handle_data(request):
+    now = asyncio.get_running_loop().time()
+    if now >= _cache["exp"]:
+        # Newest first, as stored
+        _cache["body"] = _dumps({"rows": to_dashboard_rows(get_latest_data())})
+        _cache["exp"] = now + CACHE_TTL
+
+    return web.Response(body=_cache["body"], content_type="application/json")
+
+# -----------------------------
+# Live updates (Server-Sent Events)
+# -----------------------------
+SSE_QUEUE_SIZE = 100
+
+# One queue per connected dashboard, fed after each writer commit
+_subscribers = set()
+
+def broadcast_rows(rows: list):
+    if not _subscribers:
+        return
 
-    for s, ts, t, h, w in rows:
-        # 🔥 REPLACED: station_id -> location
-        location = extract_station_location(s)
-        html += f"<tr><td>{location}</td><td>{ts:.2f}</td><td>{t}</td><td>{h}</td><td>{w}</td></tr>"
+    # Commit order, i.e. oldest first
+    payload = _dumps(to_dashboard_rows(rows))
+
+    for subscriber in _subscribers:
+        try:
+            subscriber.put_nowait(payload)
+        except asyncio.QueueFull:
+            pass  # slow client, drop the update
+
+async def handle_stream(request):
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+    })
+    # Subscribe before the client sees the stream open, so nothing
+    # committed after its /data.json snapshot can be missed
+    subscriber = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+    _subscribers.add(subscriber)
 
-    html += "</table></body></html>"
+    try:
+        await response.prepare(request)
+        await response.write(b": ok\n\n")  # flush headers so onopen fires
+
+        while True:
+            payload = await subscriber.get()
+            if payload is None:  # server shutting down
+                break
+            await response.write(b"data: " + payload + b"\n\n")
+    except ConnectionResetError:
+        pass
+    finally:
+        _subscribers.discard(subscriber)
+
+    return response
 
-    return web.Response(text=html, content_type="text/html")
+async def close_streams(app: web.Application):
+    # Ends every open stream so graceful shutdown doesn't wait on them
+    for subscriber in _subscribers:
+        if subscriber.full():
+            subscriber.get_nowait()
+        subscriber.put_nowait(None)
 
 # -----------------------------
 # Database setup
 # -----------------------------
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     conn.execute("PRAGMA journal_mode=WAL;")
+    # WAL only needs fsync at checkpoints; trade durability of the
+    # last few commits on power loss for far fewer disk syncs
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA cache_size=-64000;")      # ~64 MB page cache
+    conn.execute("PRAGMA mmap_size=268435456;")    # 256 MB
+    conn.execute("PRAGMA wal_autocheckpoint=1000;")
+    conn.execute("PRAGMA busy_timeout=5000;")
     return conn
 
 def init_database():
@@ -117,113 +341,259 @@ def init_database():
             wind REAL
         )
     """)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_station
+        ON weather_data (station_id, id DESC)
+    """)
     conn.commit()
     conn.close()
 
-def save_station_data(data: dict):
-    station = sanitize(data["station_id"])
-    table = f"{station}_data"
+BATCH_SIZE = 200
+BATCH_TIMEOUT = 0.1  # seconds to wait for a batch to fill up
 
-    conn = get_db()
-    cur = conn.cursor()
+# Rows waiting for the writer thread; None asks it to stop
+_write_q = queue.SimpleQueue()
 
-    cur.execute("""
-        INSERT INTO weather_data (station_id, timestamp, temperature, humidity, wind)
-        VALUES (?, ?, ?, ?, ?)
-    """, (
-        data["station_id"],
-        data["timestamp"],
-        data["temperature"],
-        data["humidity"],
-        data["wind"]
-    ))
-
-    cur.execute(f"""
-        CREATE TABLE IF NOT EXISTS {table} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp REAL NOT NULL,
-            temperature REAL,
-            humidity REAL,
-            wind REAL
-        )
-    """)
+# Set once the writer thread has exited; rows are no longer accepted
+_writer_done = threading.Event()
 
-    cur.execute(
-        f"INSERT INTO {table} (timestamp, temperature, humidity, wind) VALUES (?, ?, ?, ?)",
-        (data["timestamp"], data["temperature"], data["wind"], data["humidity"])
-    )
+# Long-lived connections, one per role, opened in main(). Only the
+# writer thread uses _writer_conn; WAL lets the dashboard read on
+# _reader_conn while the writer commits.
+_writer_conn: sqlite3.Connection = None
+_reader_conn: sqlite3.Connection = None
 
+def save_station_rows(conn: sqlite3.Connection, rows: list) -> list:
+    """
+    Insert rows in one transaction. If the batch fails, retry row by
+    row so only the offending rows are dropped. Returns the rows saved,
+    each prefixed with its id.
+    """
+    try:
+        conn.executemany(_INSERT_SQL, rows)
+        # This thread is the only writer, so the batch got consecutive ids
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        conn.commit()
+        first_id = last_id - len(rows) + 1
+        return [(first_id + i,) + row for i, row in enumerate(rows)]
+    except Exception as e:
+        conn.rollback()
+        log.warning("Batch insert failed, retrying row by row: %s", e)
+
+    saved = []
+    for row in rows:
+        try:
+            cur = conn.execute(_INSERT_SQL, row)
+            saved.append((cur.lastrowid,) + row)
+        except Exception as e:
+            log.warning("Dropped row %r: %s", row, e)
     conn.commit()
-    conn.close()
+
+    return saved
+
+def _on_commit(rows: list):
+    # Runs on the event loop thread
+    _cache["exp"] = 0.0
+    broadcast_rows(rows)
+
+def _writer_loop(conn: sqlite3.Connection, loop: asyncio.AbstractEventLoop):
+    """
+    Single consumer of _write_q, run in a dedicated thread so sqlite3
+    commits never block the event loop. Drains up to BATCH_SIZE rows
+    (or whatever arrives within BATCH_TIMEOUT) and commits them
+    in one transaction.
+    """
+    stopping = False
+
+    try:
+        while not stopping:
+            row = _write_q.get()
+            if row is None:
+                break
+
+            rows = [row]
+            deadline = time.monotonic() + BATCH_TIMEOUT
+
+            while len(rows) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        row = _write_q.get(timeout=remaining)
+                    else:
+                        row = _write_q.get_nowait()
+                except queue.Empty:
+                    break
+
+                if row is None:
+                    stopping = True
+                    break
+                rows.append(row)
+
+            try:
+                saved = save_station_rows(conn, rows)
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Saved %d rows", len(saved))
+                if saved:
+                    loop.call_soon_threadsafe(_on_commit, saved)
+            except Exception:
+                log.exception("Writer error on a batch of %d rows", len(rows))
+    except BaseException:
+        log.critical("Writer thread died, no longer accepting rows", exc_info=True)
+        raise
+    finally:
+        _writer_done.set()
 
 # -----------------------------
 # Message handling
 # -----------------------------
-async def process_message(message: str):
+_FIELDS = ("station_id", "timestamp", "temperature", "humidity", "wind")
+_REQUIRED = frozenset(_FIELDS)
+_get_row = operator.itemgetter(*_FIELDS)  # row tuple in INSERT column order
+
+# SQLite INTEGER is a signed 64-bit value
+_INT_MIN = -2 ** 63
+_INT_MAX = 2 ** 63 - 1
+
+def valid_number(value) -> bool:
+    # type() rather than isinstance() so bools are rejected
+    kind = type(value)
+    if kind is int:
+        return _INT_MIN <= value <= _INT_MAX
+    if kind is float:
+        return math.isfinite(value)
+    return False
+
+async def process_message(message: bytes):
     try:
-        data = json.loads(message)
-    except json.JSONDecodeError:
-        logging.warning(f"Invalid JSON discarded: {message!r}")
+        data = _loads(message)
+    except ValueError:  # JSONDecodeError, or invalid UTF-8 in the stdlib path
+        log.warning("Invalid JSON discarded: %r", message)
         return
 
-    required = {"station_id", "timestamp", "temperature", "humidity", "wind"}
-
-    if not required.issubset(data):
-        logging.warning(f"Missing required keys: {message!r}")
+    if not isinstance(data, dict) or not _REQUIRED <= data.keys():
+        log.warning("Missing required keys: %r", message)
         return
 
+    row = _get_row(data)
+
     try:
-        save_station_data(data)
-        logging.info(f"Saved station={data['station_id']} temp={data['temperature']}")
-    except Exception as e:
-        logging.error(f"Database save error: {e}")
+        sanitize(row[0])
+    except (TypeError, ValueError) as e:
+        log.warning("Rejected message: %s", e)
+        return
+
+    if not all(map(valid_number, row[1:])):
+        log.warning("Non-numeric or out-of-range reading: %r", message)
+        return
+
+    if _writer_done.is_set():
+        return  # nothing would ever read it
+
+    _write_q.put_nowait(row)
 
 # -----------------------------
 # Per-client handler
 # -----------------------------
+KEEPALIVE_IDLE = 30      # seconds of silence before the first probe
+KEEPALIVE_INTERVAL = 10  # seconds between probes
+KEEPALIVE_COUNT = 3      # unanswered probes before the peer is dead
+
+def enable_keepalive(sock):
+    """
+    Let the kernel detect dead peers, so a lost client ends in an
+    EOF/reset on readline() without a Python timer per read.
+    """
+    if sock is None:
+        return
+
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # The fine-grained knobs are not available on every platform
+    for name, value in (
+        ("TCP_KEEPIDLE", KEEPALIVE_IDLE),
+        ("TCP_KEEPINTVL", KEEPALIVE_INTERVAL),
+        ("TCP_KEEPCNT", KEEPALIVE_COUNT),
+    ):
+        if hasattr(socket, name):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+
 async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
 
     addr = writer.get_extra_info("peername")
-    logging.info(f"Client connected: {addr}")
+    log.info("Client connected: %s", addr)
 
     try:
+        try:
+            enable_keepalive(writer.get_extra_info("socket"))
+        except OSError as e:
+            # e.g. the peer already reset; readline() will notice soon enough
+            log.warning("Could not enable keepalive for %s: %s", addr, e)
+
         while True:
             try:
-                data = await asyncio.wait_for(reader.readline(), timeout=60)
-            except asyncio.TimeoutError:
-                logging.warning(f"Client timed out: {addr}")
-                break
+                data = await reader.readline()
+            except ValueError:
+                # Line exceeded the StreamReader limit; the buffer was discarded
+                log.warning("Dropped oversized message from %s", addr)
+                continue
 
             if not data:
                 break
 
-            message = data.decode("utf-8", errors="replace").strip()
+            message = data.strip()
 
-            if len(message) > 2048:
-                logging.warning(f"Dropped oversized message from {addr}")
+            if len(message) > MAX_MESSAGE_SIZE:
+                log.warning("Dropped oversized message from %s", addr)
                 continue
 
             await process_message(message)
 
     except Exception as e:
-        logging.error(f"Client error {addr}: {e}")
+        log.error("Client error %s: %s", addr, e)
 
     finally:
-        logging.info(f"Client disconnected: {addr}")
+        log.info("Client disconnected: %s", addr)
         writer.close()
         await writer.wait_closed()
 
 # -----------------------------
 # Main server
 # -----------------------------
+async def shutdown(writer: threading.Thread, runner: web.AppRunner):
+    # Let the writer flush what is already queued, then stop
+    _write_q.put(None)
+    await asyncio.to_thread(writer.join)
+
+    await runner.cleanup()
+
+    for conn in (_writer_conn, _reader_conn):
+        if conn is not None:
+            conn.close()
+
 async def main():
+    global _writer_conn, _reader_conn
+
     init_database()
+    _writer_conn = get_db()
+    _reader_conn = get_db()
+
+    writer = threading.Thread(
+        target=_writer_loop,
+        args=(_writer_conn, asyncio.get_running_loop()),
+        name="sqlite-writer",
+        daemon=True,
+    )
+    writer.start()
 
-    sensor_server = await asyncio.start_server(handle_client, HOST, PORT)
+    sensor_server = await asyncio.start_server(
+        handle_client, HOST, PORT, limit=STREAM_LIMIT
+    )
     print(f"Sensor server listening on {HOST}:{PORT}")
 
     app = web.Application()
-    app.router.add_get("/", handle_web)
+    app.router.add_get("/", handle_index)
+    app.router.add_get("/data.json", handle_data)
+    app.router.add_get("/stream", handle_stream)
+    app.on_shutdown.append(close_streams)
 
     runner = web.AppRunner(app)
     await runner.setup()
@@ -231,12 +601,15 @@ async def main():
     await site.start()
     print("Web dashboard running at http://127.0.0.1:8080")
 
-    async with sensor_server:
-        await asyncio.gather(sensor_server.serve_forever())
+    try:
+        async with sensor_server:
+            await asyncio.gather(sensor_server.serve_forever())
+    finally:
+        await shutdown(writer, runner)
 
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        logging.info("Server stopped.")
+        log.info("Server stopped.")
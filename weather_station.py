@@ -4,47 +4,74 @@ import time
 import random
 import json
 import sys
+from functools import lru_cache
+
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # fall back to the stdlib serializer
+    def dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+try:
+    import numpy as np
+    _rng = np.random.default_rng()
+except ImportError:  # fall back to random.gauss per sample
+    np = None
 
 HOST = "127.0.0.1"
 PORT = 39000
 
+SAMPLE_INTERVAL = 1.5  # seconds between samples
+BATCH_SIZE = 5         # samples per TCP write
+BATCH_INTERVAL = 10.0  # flush at least this often, in seconds
+
 # -----------------------------
 # Gaussian weather generator
 # -----------------------------
+# Climate profiles per station type:
+# (temp_mean, temp_std, hum_mean, hum_std, wind_mean, wind_std)
+_PROFILES = {
+    "normal":   (18, 7, 55, 20, 8, 5),
+    "coastal":  (20, 4, 75, 10, 12, 6),
+    "mountain": (5, 8, 40, 15, 18, 10),
+    "desert":   (33, 7, 20, 10, 6, 4),
+}
+
+SAMPLE_BATCH = 1024
+
+# Pre-generated (temperature, humidity, wind) samples per station type
+_samples = {}
+
+def _numpy_samples(profile):
+    tm, ts, hm, hs, wm, ws = profile
+    n = SAMPLE_BATCH
+
+    temperature = _rng.normal(tm, ts, n).round(1).clip(-30, 50)
+    humidity = _rng.normal(hm, hs, n).round(1).clip(0, 100)
+    wind = np.abs(_rng.normal(wm, ws, n)).round(1).clip(0, 120)
+
+    # tolist() gives plain floats, which any JSON encoder accepts
+    return list(zip(temperature.tolist(), humidity.tolist(), wind.tolist()))
+
 def gaussian_weather(station_type="normal"):
-    # Default climate profile
-    climate = {
-        "temp_mean": 18, "temp_std": 7,
-        "hum_mean": 55, "hum_std": 20,
-        "wind_mean": 8, "wind_std": 5
-    }
-
-    # Climate profiles per station type
-    if station_type == "coastal":
-        climate.update({
-            "temp_mean": 20, "temp_std": 4,
-            "hum_mean": 75, "hum_std": 10,
-            "wind_mean": 12, "wind_std": 6
-        })
-
-    elif station_type == "mountain":
-        climate.update({
-            "temp_mean": 5, "temp_std": 8,
-            "hum_mean": 40, "hum_std": 15,
-            "wind_mean": 18, "wind_std": 10
-        })
-
-    elif station_type == "desert":
-        climate.update({
-            "temp_mean": 33, "temp_std": 7,
-            "hum_mean": 20, "hum_std": 10,
-            "wind_mean": 6, "wind_std": 4
-        })
+    profile = _PROFILES.get(station_type, _PROFILES["normal"])
+
+    if np is not None:
+        samples = _samples.get(station_type)
+        if not samples:
+            samples = _samples[station_type] = _numpy_samples(profile)
+        return samples.pop()
+
+    tm, ts, hm, hs, wm, ws = profile
 
     # Generate Gaussian values
-    temperature = round(random.gauss(climate["temp_mean"], climate["temp_std"]), 1)
-    humidity = round(random.gauss(climate["hum_mean"], climate["hum_std"]), 1)
-    wind = round(abs(random.gauss(climate["wind_mean"], climate["wind_std"])), 1)
+    gauss = random.gauss
+    temperature = round(gauss(tm, ts), 1)
+    humidity = round(gauss(hm, hs), 1)
+    wind = round(abs(gauss(wm, ws)), 1)
 
     # Clamp to realistic limits
     temperature = max(-30, min(50, temperature))
@@ -54,6 +81,7 @@ def gaussian_weather(station_type="normal"):
     return temperature, humidity, wind
 
 
+@lru_cache(maxsize=256)
 def extract_station_type(station_id):
     """
     Allows naming like:
@@ -62,9 +90,9 @@ def extract_station_type(station_id):
       mymountainstation_mountain
       sensorA_normal
     """
-    parts = station_id.lower().split("_")
-    if len(parts) > 1:
-        return parts[-1]  # what comes after last underscore
+    _, sep, station_type = station_id.lower().rpartition("_")
+    if sep:
+        return station_type  # what comes after last underscore
     return "normal"
 
 
@@ -78,9 +106,15 @@ def main():
     station_type = extract_station_type(station_id)
 
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
     s.connect((HOST, PORT))
     print(f"Connected to server as {station_id} (type={station_type})")
 
+    # Newline-delimited samples waiting to be sent in one write
+    buf = bytearray()
+    pending = 0
+    last_flush = time.monotonic()
+
     try:
         while True:
             temperature, humidity, wind = gaussian_weather(station_type)
@@ -93,18 +127,32 @@ def main():
                 "wind": wind
             }
 
-            msg_json = json.dumps(message) + "\n"
-            print("Sending:", msg_json.strip())
-            s.sendall(msg_json.encode())
+            msg_json = dumps(message)
+            print("Queued:", msg_json.decode())
+            buf += msg_json
+            buf += b"\n"
+            pending += 1
+
+            now = time.monotonic()
+            if pending >= BATCH_SIZE or now - last_flush >= BATCH_INTERVAL:
+                s.sendall(buf)
+                print(f"Sent {pending} samples")
+                buf.clear()
+                pending = 0
+                last_flush = now
 
-            time.sleep(1.5)
+            time.sleep(SAMPLE_INTERVAL)
 
     except KeyboardInterrupt:
         print("Client stopped.")
 
     finally:
+        if buf:
+            try:
+                s.sendall(buf)
+            except OSError:
+                pass
         s.close()
 
-
 if __name__ == "__main__":
     main()